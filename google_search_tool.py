@@ -5,14 +5,106 @@ Searches Google for a keyword and returns a list of website links.
 Uses SerpAPI (recommended) or Google Custom Search JSON API.
 """
 
+import asyncio
+import contextlib
+import functools
 import os
+import sys
+import time
+from collections.abc import Awaitable, Callable
 
+import aiohttp
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import jsonio
+from rate_limiter import RateLimiter
 
 load_dotenv()
 
 RESULTS_PER_REQUEST = 10
+SERPAPI_URL = "https://serpapi.com/search"
+SERPAPI_JSON_RESTRICTOR = (
+    "organic_results[].{link,title,snippet,displayed_link},serpapi_pagination.next_link,error"
+)
+# SerpAPI plan quota (searches/hour) and max in-flight requests for the async client.
+SERPAPI_SEARCHES_PER_HOUR = 5000
+SERPAPI_MAX_CONCURRENCY = 10
+# Batch mode: searches are submitted with async=true, then fetched from the archive when ready.
+SERPAPI_ARCHIVE_URL = "https://serpapi.com/searches/{id}.json"
+SERPAPI_BATCH_JSON_RESTRICTOR = SERPAPI_JSON_RESTRICTOR + ",search_metadata.id,search_metadata.status"
+SERPAPI_BATCH_POLL_INTERVAL = 1.0
+SERPAPI_BATCH_POLL_TIMEOUT = 90
+# Transient errors are retried with exponential backoff (1s, 2s, 4s, ...), honoring Retry-After;
+# every wait, including Retry-After, is capped at MAX_RETRY_WAIT seconds.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+MAX_RETRY_WAIT = 60
+
+
+class _CappedRetry(Retry):
+    """urllib3 Retry that waits at most MAX_RETRY_WAIT even if Retry-After asks for longer."""
+
+    def get_retry_after(self, response) -> float | None:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_WAIT)
+
+
+def _make_session() -> requests.Session:
+    """Session with keep-alive connection pooling; retries transient errors (429/5xx) with backoff."""
+    session = requests.Session()
+    retry = _CappedRetry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        backoff_max=MAX_RETRY_WAIT,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+    return session
+
+
+# One session for the whole process: repeated calls to the same host reuse the TLS connection.
+_SESSION = _make_session()
+
+
+def _serpapi_params(keyword: str, api_key: str, num: int, start: int) -> dict:
+    """Query parameters for one SerpAPI results page."""
+    return {
+        "engine": "google",
+        "q": keyword,
+        "api_key": api_key,
+        "num": num,
+        "start": start,
+        # Only return the fields we read (smaller response, faster to parse).
+        "json_restrictor": SERPAPI_JSON_RESTRICTOR,
+    }
+
+
+def _collect_items(
+    items: list[dict],
+    display_link_key: str,
+    results: list[dict],
+    seen: set[str],
+    num_results: int,
+) -> None:
+    """Append normalized items from one results page to results (links not in seen, up to num_results)."""
+    add_seen = seen.add
+    results.extend(
+        {
+            "link": link,
+            "title": item.get("title", ""),
+            "snippet": item.get("snippet", ""),
+            "display_link": item.get(display_link_key, ""),
+        }
+        for item in items
+        # add_seen() returns None, so `not add_seen(link)` records the link and keeps the item.
+        if (link := item.get("link")) and link not in seen and not add_seen(link)
+    )
+    del results[num_results:]
 
 
 def _search_serpapi(
@@ -22,33 +114,17 @@ def _search_serpapi(
 ) -> list[dict]:
     """Use SerpAPI to get Google search results (works for new users)."""
     results: list[dict] = []
+    seen: set[str] = set()
     start = 0
     num = min(20, max(10, num_results))
 
     while len(results) < num_results:
-        url = "https://serpapi.com/search"
-        params = {
-            "engine": "google",
-            "q": keyword,
-            "api_key": api_key,
-            "num": num,
-            "start": start,
-        }
-        resp = requests.get(url, params=params, timeout=20)
+        params = _serpapi_params(keyword, api_key, num, start)
+        resp = _SESSION.get(SERPAPI_URL, params=params, timeout=20)
         if resp.status_code != 200:
             raise RuntimeError(f"SerpAPI error {resp.status_code}: {resp.text}")
-        data = resp.json()
-        for item in data.get("organic_results", []):
-            link = item.get("link")
-            if link and link not in (r["link"] for r in results):
-                results.append({
-                    "link": link,
-                    "title": item.get("title", ""),
-                    "snippet": item.get("snippet", ""),
-                    "display_link": item.get("displayed_link", ""),
-                })
-            if len(results) >= num_results:
-                break
+        data = jsonio.loads(resp.content)
+        _collect_items(data.get("organic_results", ()), "displayed_link", results, seen, num_results)
         if len(results) >= num_results:
             break
         start += num
@@ -57,6 +133,167 @@ def _search_serpapi(
     return results[:num_results]
 
 
+def serpapi_rate_limiter() -> RateLimiter:
+    """Token bucket matching the SerpAPI plan quota (SERPAPI_SEARCHES_PER_HOUR)."""
+    return RateLimiter(rate=SERPAPI_SEARCHES_PER_HOUR / 3600, max_tokens=10)
+
+
+def _retry_wait(retry_after: str | None, attempt: int) -> float:
+    """Seconds to wait before retry number attempt+1: Retry-After (seconds) if given, else 2**attempt."""
+    try:
+        wait = float(retry_after) if retry_after else 2 ** attempt
+    except ValueError:  # HTTP-date form; not worth parsing
+        wait = 2 ** attempt
+    return min(max(wait, 0), MAX_RETRY_WAIT)
+
+
+async def _get_serpapi_page(
+    session: aiohttp.ClientSession,
+    params: dict,
+    timeout: aiohttp.ClientTimeout,
+    limiter: RateLimiter | None,
+    sem: asyncio.Semaphore | None,
+    url: str = SERPAPI_URL,
+) -> dict:
+    """
+    GET one SerpAPI page, waiting for a rate-limit token and a concurrency slot first.
+    429/5xx responses and network errors are retried (up to MAX_RETRIES) after a backoff.
+    """
+    attempt = 0
+    while True:
+        retry_after = None
+        async with sem if sem is not None else contextlib.nullcontext():
+            if limiter is not None:
+                await limiter.wait_for_token()
+            try:
+                async with session.get(url, params=params, timeout=timeout) as resp:
+                    if resp.status == 200:
+                        return await resp.json(loads=jsonio.loads)
+                    if resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                        raise RuntimeError(f"SerpAPI error {resp.status}: {await resp.text()}")
+                    retry_after = resp.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+        # Back off outside the semaphore so other keywords can use the slot meanwhile.
+        await asyncio.sleep(_retry_wait(retry_after, attempt))
+        attempt += 1
+
+
+async def _paginate_serpapi(
+    keyword: str,
+    num_results: int,
+    api_key: str,
+    fetch_page: Callable[[dict], Awaitable[dict]],
+) -> list[dict]:
+    """Fetch SerpAPI pages with fetch_page(params) until num_results, page 100 or no next_link."""
+    results: list[dict] = []
+    seen: set[str] = set()
+    start = 0
+    num = min(20, max(10, num_results))
+
+    while len(results) < num_results:
+        data = await fetch_page(_serpapi_params(keyword, api_key, num, start))
+        _collect_items(data.get("organic_results", ()), "displayed_link", results, seen, num_results)
+        if len(results) >= num_results:
+            break
+        start += num
+        if start >= 100 or not data.get("serpapi_pagination", {}).get("next_link"):
+            break
+    return results[:num_results]
+
+
+async def search_serpapi_async(
+    session: aiohttp.ClientSession,
+    keyword: str,
+    num_results: int,
+    api_key: str,
+    limiter: RateLimiter | None = None,
+    sem: asyncio.Semaphore | None = None,
+) -> list[dict]:
+    """
+    Same as _search_serpapi, but non-blocking on a shared aiohttp session (for many keywords at once).
+    Pass the same limiter/sem to every call to keep the combined request rate and concurrency in bounds.
+    """
+    timeout = aiohttp.ClientTimeout(total=20)
+
+    def fetch_page(params: dict) -> Awaitable[dict]:
+        return _get_serpapi_page(session, params, timeout, limiter, sem)
+
+    return await _paginate_serpapi(keyword, num_results, api_key, fetch_page)
+
+
+async def _submit_serpapi_batch_page(
+    session: aiohttp.ClientSession,
+    params: dict,
+    timeout: aiohttp.ClientTimeout,
+    limiter: RateLimiter | None,
+    sem: asyncio.Semaphore | None,
+) -> str:
+    """Submit one search with async=true. Returns its search id."""
+    submitted = await _get_serpapi_page(
+        session, {**params, "async": "true", "json_restrictor": SERPAPI_BATCH_JSON_RESTRICTOR}, timeout, limiter, sem
+    )
+    search_id = submitted.get("search_metadata", {}).get("id")
+    if not search_id:
+        raise RuntimeError(f"SerpAPI error: async search not accepted: {submitted.get('error', submitted)}")
+    return search_id
+
+
+async def _poll_serpapi_batch_page(
+    session: aiohttp.ClientSession,
+    search_id: str,
+    api_key: str,
+    timeout: aiohttp.ClientTimeout,
+    sem: asyncio.Semaphore | None,
+) -> dict:
+    """Poll the searches archive until a submitted search is ready. Returns its results page."""
+    url = SERPAPI_ARCHIVE_URL.format(id=search_id)
+    poll_params = {"api_key": api_key, "json_restrictor": SERPAPI_BATCH_JSON_RESTRICTOR}
+    deadline = time.monotonic() + SERPAPI_BATCH_POLL_TIMEOUT
+    while True:
+        await asyncio.sleep(SERPAPI_BATCH_POLL_INTERVAL)
+        # Archive reads don't use search credits, so no rate-limit token here.
+        data = await _get_serpapi_page(session, poll_params, timeout, None, sem, url=url)
+        status = data.get("search_metadata", {}).get("status")
+        if status == "Success":
+            return data
+        if status == "Error" or data.get("error"):
+            raise RuntimeError(f"SerpAPI error: {data.get('error', status)}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"SerpAPI error: search {search_id} not ready after {SERPAPI_BATCH_POLL_TIMEOUT}s")
+
+
+def search_serpapi_batch(
+    session: aiohttp.ClientSession,
+    keywords: list[str],
+    num_results: int,
+    api_key: str,
+    limiter: RateLimiter | None = None,
+    sem: asyncio.Semaphore | None = None,
+) -> dict[str, asyncio.Task[list[dict]]]:
+    """
+    Start a batch search of many keywords (call from a running event loop): the first page of every
+    keyword is submitted up front (async=true), so SerpAPI works on all of them in parallel; a keyword's
+    next page is submitted only once its previous page has a next_link. A page SerpAPI did not accept
+    is fetched live instead; once accepted (and paid for), it is only ever polled.
+    Returns keyword → task with that keyword's results (same shape as _search_serpapi).
+    """
+    timeout = aiohttp.ClientTimeout(total=20)
+
+    async def fetch_page(params: dict) -> dict:
+        try:
+            search_id = await _submit_serpapi_batch_page(session, params, timeout, limiter, sem)
+        except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError):
+            return await _get_serpapi_page(session, params, timeout, limiter, sem)
+        return await _poll_serpapi_batch_page(session, search_id, api_key, timeout, sem)
+
+    return {
+        kw: asyncio.create_task(_paginate_serpapi(kw, num_results, api_key, fetch_page))
+        for kw in keywords
+    }
+
+
 def _search_google_cse(
     keyword: str,
     num_results: int,
@@ -66,6 +303,7 @@ def _search_google_cse(
 ) -> list[dict]:
     """Use Google Custom Search JSON API (may 403 for new projects)."""
     results: list[dict] = []
+    seen: set[str] = set()
     start_index = 1
     while len(results) < num_results:
         count = min(RESULTS_PER_REQUEST, num_results - len(results))
@@ -79,26 +317,16 @@ def _search_google_cse(
         }
         if lang:
             params["lr"] = lang
-        resp = requests.get(url, params=params, timeout=15)
+        resp = _SESSION.get(url, params=params, timeout=15)
         if resp.status_code != 200:
             raise RuntimeError(
                 f"Google Custom Search API error {resp.status_code}: {resp.text}"
             )
-        data = resp.json()
+        data = jsonio.loads(resp.content)
         total = data.get("searchInformation", {}).get("totalResults")
         if total is not None and int(total) == 0:
             break
-        for item in data.get("items", []):
-            link = item.get("link")
-            if link and link not in (r["link"] for r in results):
-                results.append({
-                    "link": link,
-                    "title": item.get("title", ""),
-                    "snippet": item.get("snippet", ""),
-                    "display_link": item.get("displayLink", ""),
-                })
-            if len(results) >= num_results:
-                break
+        _collect_items(data.get("items", ()), "displayLink", results, seen, num_results)
         if len(results) >= num_results:
             break
         start_index += count
@@ -107,6 +335,36 @@ def _search_google_cse(
     return results[:num_results]
 
 
+# Credentials are read once, at import (after load_dotenv), and the default backend is fixed then.
+SERPAPI_KEY = os.environ.get("SERPAPI_KEY")
+GOOGLE_SEARCH_API_KEY = os.environ.get("GOOGLE_SEARCH_API_KEY")
+GOOGLE_SEARCH_ENGINE_ID = os.environ.get("GOOGLE_SEARCH_ENGINE_ID")
+
+
+def _search_not_configured(keyword: str, num_results: int) -> list[dict]:
+    raise ValueError(
+        "No search backend configured. Set SERPAPI_KEY, or GOOGLE_SEARCH_API_KEY and "
+        "GOOGLE_SEARCH_ENGINE_ID, in .env (or pass credentials to search_google)."
+    )
+
+
+def _resolve_search_fn() -> Callable[[str, int], list[dict]]:
+    """Default backend: SerpAPI if SERPAPI_KEY is set, else Google CSE if its credentials are set."""
+    if SERPAPI_KEY:
+        return functools.partial(_search_serpapi, api_key=SERPAPI_KEY)
+    if GOOGLE_SEARCH_API_KEY and GOOGLE_SEARCH_ENGINE_ID:
+        return functools.partial(
+            _search_google_cse,
+            api_key=GOOGLE_SEARCH_API_KEY,
+            search_engine_id=GOOGLE_SEARCH_ENGINE_ID,
+            lang="lang_en",
+        )
+    return _search_not_configured
+
+
+_SEARCH_FN = _resolve_search_fn()
+
+
 def search_google(
     keyword: str,
     num_results: int = 10,
@@ -122,6 +380,7 @@ def search_google(
 
     By default uses SerpAPI if SERPAPI_KEY is set, otherwise Google Custom Search.
     SerpAPI works for new users; Google CSE often returns 403 for new projects.
+    With no arguments besides keyword/num_results, the backend chosen at import is used directly.
 
     Args:
         keyword: Search term (e.g. "Monoreah").
@@ -137,10 +396,15 @@ def search_google(
     """
     if num_results <= 0:
         return []
+    if (
+        api_key is None and search_engine_id is None and serpapi_key is None
+        and use_serpapi is None and lang == "lang_en"
+    ):
+        return _SEARCH_FN(keyword, num_results)
 
-    serp_key = serpapi_key or os.environ.get("SERPAPI_KEY")
-    google_key = api_key or os.environ.get("GOOGLE_SEARCH_API_KEY")
-    cx = search_engine_id or os.environ.get("GOOGLE_SEARCH_ENGINE_ID")
+    serp_key = serpapi_key or SERPAPI_KEY
+    google_key = api_key or GOOGLE_SEARCH_API_KEY
+    cx = search_engine_id or GOOGLE_SEARCH_ENGINE_ID
 
     use_serp = use_serpapi
     if use_serp is None:
@@ -211,19 +475,20 @@ def main() -> None:
     try:
         results = search_google(keyword=args.keyword, num_results=args.num)
     except (ValueError, RuntimeError) as e:
-        print(f"Error: {e}", file=__import__("sys").stderr)
+        print(f"Error: {e}", file=sys.stderr)
         raise SystemExit(1)
 
+    # Build the whole listing and write it once instead of several print() calls per result.
+    out = []
     if args.links_only:
-        for r in results:
-            print(r["link"])
+        out.extend(f"{r['link']}\n" for r in results)
     else:
         for i, r in enumerate(results, 1):
-            print(f"{i}. {r['title']}")
-            print(f"   {r['link']}")
+            out.append(f"{i}. {r['title']}\n   {r['link']}\n")
             if r["snippet"]:
-                print(f"   {r['snippet'][:150]}...")
-            print()
+                out.append(f"   {r['snippet'][:150]}...\n")
+            out.append("\n")
+    sys.stdout.write("".join(out))
 
 
 if __name__ == "__main__":
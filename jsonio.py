@@ -0,0 +1,44 @@
+"""
+JSON encode/decode via orjson when installed (much faster), else the stdlib json module,
+plus crash-safe (atomic) file writes.
+
+dumps() always returns UTF-8 bytes with non-ASCII characters kept as-is (like ensure_ascii=False).
+Decode errors are json.JSONDecodeError in both cases (orjson's error subclasses it).
+"""
+
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize obj to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Replace path with data without ever leaving it truncated: write a temp file in the same
+    directory, fsync it, then os.replace() it over path. A crash keeps the old or the new file.
+    """
+    tmp = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
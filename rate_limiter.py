@@ -0,0 +1,38 @@
+"""
+Token-bucket rate limiter for asyncio code.
+
+Tokens refill continuously at RATE per second up to MAX_TOKENS; each request
+takes one token, so bursts are capped at MAX_TOKENS and throughput at RATE/s.
+"""
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Call `await limiter.wait_for_token()` before each request."""
+
+    RATE = 1.0
+    MAX_TOKENS = 10
+
+    def __init__(self, rate: float | None = None, max_tokens: int | None = None) -> None:
+        if rate is not None:
+            self.RATE = rate
+        if max_tokens is not None:
+            self.MAX_TOKENS = max_tokens
+        self.tokens = self.MAX_TOKENS
+        self.updated_at = time.monotonic()
+
+    async def wait_for_token(self) -> None:
+        while self.tokens < 1:
+            self.add_new_tokens()
+            await asyncio.sleep(0.1)
+        self.tokens -= 1
+
+    def add_new_tokens(self) -> None:
+        now = time.monotonic()
+        time_since_update = now - self.updated_at
+        new_tokens = time_since_update * self.RATE
+        if self.tokens + new_tokens >= 1:
+            self.tokens = min(self.tokens + new_tokens, self.MAX_TOKENS)
+            self.updated_at = now
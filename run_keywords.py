@@ -3,22 +3,43 @@ Run search for keywords and settings from config.json.
 Edit config.json to change keywords and results_per_keyword, then run:
   python run_keywords.py
 
+Search results are cached for cache_ttl_seconds (config.json, default 900; per keyword via
+keyword_cache_ttl_seconds) in output/serp_cache.db (sqlite), so reruns within that window skip the API.
+With SerpAPI, "mode": "batch" submits every keyword's first page up front (async=true) and then collects
+them, submitting further pages only while SerpAPI reports a next page.
+
 Output:
-  - output/history/YYYY-MM-DD.json  → full result of each run, one file per day (history).
-  - output/activity.json              → unique URLs only, with first_seen datetime (activity).
-  - output/telegram_bot.json          → same as activity + telegram_sent (true/false); bot sends only false, then sets true.
+  - output/history/YYYY-MM-DD.jsonl → full results, one file per day, one line per keyword per run (history).
+  - output/activity.jsonl             → unique URLs only, with first_seen datetime (activity; URLs indexed in urls.db).
+  - output/telegram_bot.jsonl         → same as activity; whether each URL was sent (telegram_sent) is kept in urls.db. See state_store.py.
   - Telegram group                    → only URLs with telegram_sent false (if TELEGRAM_BOT_TOKEN + TELEGRAM_GROUP_CHAT_ID set).
 """
 
+import asyncio
+import hashlib
 import json
 import os
+import sqlite3
+import sys
 import time
-from datetime import datetime
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 
-import requests
+import aiohttp
 from dotenv import load_dotenv
 
-from google_search_tool import search_google
+from google_search_tool import (
+    SERPAPI_KEY,
+    SERPAPI_MAX_CONCURRENCY,
+    search_google,
+    search_serpapi_async,
+    search_serpapi_batch,
+    serpapi_rate_limiter,
+)
+import jsonio
+from send_telegram_pending import send_pending
+from state_store import ACTIVITY_FILE, TELEGRAM_BOT_FILE, State, count_pending, load_pending, load_state, mark_sent
 
 load_dotenv()
 
@@ -27,124 +48,75 @@ OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
 HISTORY_DIR = os.path.join(OUTPUT_DIR, "history")
 
 
-def _load_config() -> tuple[list[str], int]:
-    """Load keywords and results_per_keyword from config.json."""
+SERP_CACHE_DB = os.path.join(OUTPUT_DIR, "serp_cache.db")
+# When a search fails, cached results up to this old are served instead (marked stale).
+SERP_CACHE_STALE_SECONDS = 30 * 24 * 3600
+
+
+@dataclass
+class Config:
+    keywords: list[str]
+    results_per_keyword: int = 10
+    cache_ttl: int = 900
+    keyword_cache_ttl: dict[str, int] = field(default_factory=dict)
+    mode: str = "concurrent"
+
+    def ttl_for(self, keyword: str) -> int:
+        return self.keyword_cache_ttl.get(keyword, self.cache_ttl)
+
+
+def _load_config() -> Config:
+    """Load keywords, results_per_keyword, cache TTLs and search mode from config.json."""
     if not os.path.exists(CONFIG_FILE):
         raise SystemExit(f"Config not found: {CONFIG_FILE}. Create it with 'keywords' and 'results_per_keyword'.")
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(CONFIG_FILE, "rb") as f:
+        data = jsonio.loads(f.read())
     keywords = data.get("keywords", [])
     if not isinstance(keywords, list):
         keywords = []
     results_per_keyword = data.get("results_per_keyword", 10)
     if not isinstance(results_per_keyword, (int, float)) or results_per_keyword < 1:
         results_per_keyword = 10
-    return keywords, int(results_per_keyword)
-ACTIVITY_FILE = os.path.join(OUTPUT_DIR, "activity.json")
-TELEGRAM_BOT_FILE = os.path.join(OUTPUT_DIR, "telegram_bot.json")
+    cache_ttl = data.get("cache_ttl_seconds", 900)
+    if not isinstance(cache_ttl, (int, float)) or cache_ttl < 0:
+        cache_ttl = 900
+    keyword_cache_ttl = data.get("keyword_cache_ttl_seconds", {})
+    if not isinstance(keyword_cache_ttl, dict):
+        keyword_cache_ttl = {}
+    keyword_cache_ttl = {
+        k: int(v) for k, v in keyword_cache_ttl.items() if isinstance(v, (int, float)) and v >= 0
+    }
+    mode = data.get("mode", "concurrent")
+    if mode not in ("concurrent", "batch"):
+        mode = "concurrent"
+    return Config(keywords, int(results_per_keyword), int(cache_ttl), keyword_cache_ttl, mode)
 
 
-def _send_one_telegram_message(text: str, bot_token: str, chat_id: str) -> tuple[bool, str]:
-    """Send one message to Telegram. Returns (success, error_message)."""
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    try:
-        r = requests.post(api_url, json={"chat_id": chat_id, "text": text}, timeout=10)
-        if r.status_code == 200:
-            return True, ""
-        try:
-            err = r.json().get("description", r.text[:200])
-        except Exception:
-            err = r.text[:200] if r.text else str(r.status_code)
-        return False, err
-    except Exception as e:
-        return False, str(e)
-
-
-def _sync_telegram_bot_and_send(new_activity_entries: list[dict]) -> None:
+def _send_telegram(send: bool = True) -> None:
     """
-    Keep telegram_bot.json in sync with activity (same fields + telegram_sent).
-    If telegram_bot is empty but activity has data, backfill from activity (telegram_sent: true).
-    Add new entries with telegram_sent: false; send only those with false, then set true.
+    Send bot entries with telegram_sent: false (this run's new URLs plus any left over), then mark them sent.
+    With send=False, only report how many there are (they stay pending for the next send).
     """
     token = os.environ.get("TELEGRAM_BOT_TOKEN")
     chat_id = os.environ.get("TELEGRAM_GROUP_CHAT_ID")
-    _ensure_dirs()
-
-    bot_list: list[dict] = []
-    if os.path.exists(TELEGRAM_BOT_FILE):
-        try:
-            with open(TELEGRAM_BOT_FILE, "r", encoding="utf-8") as f:
-                raw = f.read().strip()
-                bot_list = json.loads(raw) if raw else []
-            if not isinstance(bot_list, list):
-                bot_list = []
-        except (json.JSONDecodeError, TypeError):
-            bot_list = []
-    seen_urls = {e["url"] for e in bot_list}
-
-    # Backfill: if telegram_bot is empty but activity has data, copy activity with telegram_sent: true (don't resend old URLs)
-    if not bot_list and os.path.exists(ACTIVITY_FILE):
-        with open(ACTIVITY_FILE, "r", encoding="utf-8") as f:
-            activity_list = json.load(f)
-        for e in activity_list:
-            url = e.get("url")
-            if url and url not in seen_urls:
-                seen_urls.add(url)
-                bot_list.append({
-                    "url": url,
-                    "first_seen": e.get("first_seen", ""),
-                    "keyword": e.get("keyword", ""),
-                    "title": e.get("title", ""),
-                    "telegram_sent": True,
-                })
-
-    for e in new_activity_entries:
-        url = e.get("url")
-        if url and url not in seen_urls:
-            seen_urls.add(url)
-            bot_list.append({
-                "url": url,
-                "first_seen": e.get("first_seen", ""),
-                "keyword": e.get("keyword", ""),
-                "title": e.get("title", ""),
-                "telegram_sent": False,
-            })
-
-    pending = [e for e in bot_list if e.get("telegram_sent") is False]
-    if not pending:
-        with open(TELEGRAM_BOT_FILE, "w", encoding="utf-8") as f:
-            json.dump(bot_list, f, ensure_ascii=False, indent=2)
-        print("Telegram: nothing to send — no new URLs this run (all results were already in activity). Only new URLs are sent. To send all once: python send_telegram_pending.py --resend-all")
+    if not send:
+        print(f"Telegram: {count_pending()} URLs pending, not sent. Send them with: python send_telegram_pending.py")
         return
-
     if not token or not chat_id:
-        with open(TELEGRAM_BOT_FILE, "w", encoding="utf-8") as f:
-            json.dump(bot_list, f, ensure_ascii=False, indent=2)
         print("Telegram: TELEGRAM_BOT_TOKEN or TELEGRAM_GROUP_CHAT_ID not set in .env")
         return
 
+    # Read only now: without a bot configured, unsent URLs pile up and would all be loaded every run.
+    pending = load_pending()
+    if not pending:
+        print("Telegram: nothing to send — no new URLs this run (all results were already in activity). Only new URLs are sent. To send all once: python send_telegram_pending.py --resend-all")
+        return
+
     # Send one URL per message (easy to view, no long block)
     total_pending = len(pending)
     print(f"Telegram: sending {total_pending} URLs (one per message)...")
-    sent_count = 0
-    first_error = ""
-    for i, e in enumerate(pending, 1):
-        link = e.get("url", "")
-        if not link:
-            continue
-        kw = e.get("keyword", "")
-        text = f"Keyword: {kw}\n{link}"
-        ok, err = _send_one_telegram_message(text, token, chat_id)
-        if ok:
-            e["telegram_sent"] = True
-            sent_count += 1
-        elif not first_error:
-            first_error = err
-        if i % 10 == 0 or i == total_pending:
-            print(f"  {i}/{total_pending} sent (ok: {sent_count})")
-        time.sleep(0.2)
-    with open(TELEGRAM_BOT_FILE, "w", encoding="utf-8") as f:
-        json.dump(bot_list, f, ensure_ascii=False, indent=2)
+    sent_count, first_error = asyncio.run(send_pending(pending, token, chat_id))
+    mark_sent([e["url"] for e in pending if e["telegram_sent"]])
     if sent_count:
         print(f"Telegram: sent {sent_count} URLs (one per message).")
     else:
@@ -155,80 +127,199 @@ def _ensure_dirs() -> None:
     os.makedirs(HISTORY_DIR, exist_ok=True)
 
 
-def _save_history(run_at: str, results_by_keyword: dict) -> None:
-    """Append this run to today's history file (one file per day)."""
+def _save_history(run_at: str, keyword: str, results: list[dict], source: str) -> None:
+    """
+    Append one keyword's results for this run to today's history file (one file per day, JSON Lines).
+    source is "live", "cache", "stale" (a failed search served from an older cache entry) or "error".
+    """
     _ensure_dirs()
     date_str = run_at[:10]
-    path = os.path.join(HISTORY_DIR, f"{date_str}.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    path = os.path.join(HISTORY_DIR, f"{date_str}.jsonl")
+    line = {"run_at": run_at, "keyword": keyword, "source": source, "results": results}
+    with open(path, "ab") as f:
+        f.write(jsonio.dumps(line) + b"\n")
+
+
+def _print_results(keyword: str, outcome: tuple[list[dict], str] | Exception) -> list[dict]:
+    """Print one keyword's results (or error) with a single write. Returns the results ([] on error)."""
+    out = [f"\n{'='*60}\nKeyword: {keyword}\n{'='*60}\n"]
+    results: list[dict] = []
+    if isinstance(outcome, Exception):
+        out.append(f"Error for '{keyword}': {outcome}\n")
     else:
-        data = {"date": date_str, "runs": []}
-    data["runs"].append({
-        "run_at": run_at,
-        "results": results_by_keyword,
-    })
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        results, source = outcome
+        if source == "cache":
+            out.append("(cached results)\n")
+        elif source == "stale":
+            out.append("(search failed — showing stale cached results)\n")
+        for i, r in enumerate(results, 1):
+            out.append(f"{i}. {r['title']}\n   {r['link']}\n")
+            if r["snippet"]:
+                out.append(f"   {r['snippet'][:120]}...\n")
+            out.append("\n")
+    sys.stdout.write("".join(out))
+    return results
 
 
-def _save_activity(run_at: str, results_by_keyword: dict) -> list[dict]:
-    """Append only new (unique) URLs to activity with first_seen datetime. Returns newly added entries."""
-    _ensure_dirs()
-    existing: list[dict] = []
-    if os.path.exists(ACTIVITY_FILE):
-        with open(ACTIVITY_FILE, "r", encoding="utf-8") as f:
-            existing = json.load(f)
-    seen_urls = {e["url"] for e in existing}
-    new_entries: list[dict] = []
-    for keyword, items in results_by_keyword.items():
-        for r in items:
-            link = r.get("link")
-            if not link or link in seen_urls:
-                continue
-            seen_urls.add(link)
-            entry = {
-                "url": link,
-                "first_seen": run_at,
-                "keyword": keyword,
-                "title": r.get("title", ""),
-            }
-            existing.append(entry)
-            new_entries.append(entry)
-    with open(ACTIVITY_FILE, "w", encoding="utf-8") as f:
-        json.dump(existing, f, ensure_ascii=False, indent=2)
-    return new_entries
+_cache_conn: sqlite3.Connection | None = None
 
 
-def main() -> None:
-    keywords, results_per_keyword = _load_config()
-    run_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    results_by_keyword: dict = {}
-
-    for keyword in keywords:
-        print(f"\n{'='*60}")
-        print(f"Keyword: {keyword}")
-        print("=" * 60)
+def _cache_db() -> sqlite3.Connection:
+    """Open (once) the search-result cache: one sqlite file in WAL mode, entries older than the stale window dropped."""
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        conn = sqlite3.connect(SERP_CACHE_DB)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, created_at INTEGER, payload BLOB)")
+        conn.execute("DELETE FROM cache WHERE created_at <= ?", (int(time.time() - SERP_CACHE_STALE_SECONDS),))
+        conn.commit()
+        _cache_conn = conn
+    return _cache_conn
+
+
+def _cache_key(keyword: str, num_results: int) -> str:
+    return hashlib.sha1(f"{keyword}|{num_results}".encode("utf-8")).hexdigest()
+
+
+def _read_cache(keyword: str, num_results: int, max_age: float) -> list[dict] | None:
+    """Cached results if stored at most max_age seconds ago, else None."""
+    try:
+        row = _cache_db().execute(
+            "SELECT payload FROM cache WHERE key = ? AND created_at > ?",
+            (_cache_key(keyword, num_results), time.time() - max_age),
+        ).fetchone()
+        return jsonio.loads(row[0]) if row else None
+    except (sqlite3.Error, json.JSONDecodeError):
+        return None
+
+
+def _write_cache(keyword: str, num_results: int, results: list[dict]) -> None:
+    """Store results; a cache that can't be written (e.g. locked by an overlapping run) is skipped."""
+    try:
+        conn = _cache_db()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache(key, created_at, payload) VALUES (?, ?, ?)",
+            (_cache_key(keyword, num_results), int(time.time()), jsonio.dumps(results)),
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        if _cache_conn is not None:
+            _cache_conn.rollback()
+        print(f"Warning: could not cache results for '{keyword}': {e}", file=sys.stderr)
+
+
+async def _cached_search(
+    keyword: str,
+    num_results: int,
+    ttl: int,
+    search: Callable[[str], Awaitable[list[dict]]],
+) -> tuple[list[dict], str]:
+    """
+    Results for keyword from the cache if fresher than ttl seconds, else from search().
+    If search() fails, falls back to a stale cache entry (up to SERP_CACHE_STALE_SECONDS old).
+    Returns (results, source) with source "live", "cache" or "stale".
+    """
+    if ttl > 0:
+        cached = _read_cache(keyword, num_results, ttl)
+        if cached is not None:
+            return cached, "cache"
+    try:
+        results = await search(keyword)
+    except Exception:
+        stale = _read_cache(keyword, num_results, SERP_CACHE_STALE_SECONDS)
+        if stale is None:
+            raise
+        return stale, "stale"
+    _write_cache(keyword, num_results, results)
+    return results, "live"
+
+
+async def _collect(
+    config: Config,
+    run_at: str,
+    search: Callable[[str], Awaitable[list[dict]]],
+    state: State,
+) -> None:
+    """
+    Search every keyword concurrently (through the result cache) and, as each one completes,
+    print it, append it to history and ingest it into state (activity + telegram bot).
+    """
+    num = config.results_per_keyword
+
+    async def search_keyword(kw: str) -> tuple[str, tuple[list[dict], str] | Exception]:
         try:
-            results = search_google(keyword=keyword, num_results=results_per_keyword)
-            results_by_keyword[keyword] = results
-            for i, r in enumerate(results, 1):
-                print(f"{i}. {r['title']}")
-                print(f"   {r['link']}")
-                if r["snippet"]:
-                    print(f"   {r['snippet'][:120]}...")
-                print()
-        except (ValueError, RuntimeError) as e:
-            print(f"Error for '{keyword}': {e}")
-            results_by_keyword[keyword] = []
+            return kw, await _cached_search(kw, num, config.ttl_for(kw), search)
+        except Exception as e:
+            return kw, e
+
+    for task in asyncio.as_completed([search_keyword(kw) for kw in config.keywords]):
+        keyword, outcome = await task
+        results = _print_results(keyword, outcome)
+        source = "error" if isinstance(outcome, Exception) else outcome[1]
+        _save_history(run_at, keyword, results, source)
+        state.ingest(run_at, keyword, results)
 
+
+async def _run_all(config: Config, run_at: str, state: State) -> None:
+    """
+    Run _collect with the configured backend: SerpAPI (async; through a batch of async=true searches
+    if config.mode is "batch") or Google CSE (blocking calls in threads).
+    """
+    num = config.results_per_keyword
+    serp_key = SERPAPI_KEY
+    if not serp_key:
+        # Google CSE has no async client; run the blocking calls in threads instead.
+        async def search(kw: str) -> list[dict]:
+            return await asyncio.to_thread(search_google, keyword=kw, num_results=num)
+
+        await _collect(config, run_at, search, state)
+        return
+
+    limiter = serpapi_rate_limiter()
+    sem = asyncio.Semaphore(SERPAPI_MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=20, limit_per_host=10)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        batch: dict[str, asyncio.Task[list[dict]]] = {}
+        if config.mode == "batch":
+            misses = [
+                kw for kw in config.keywords
+                if config.ttl_for(kw) <= 0 or _read_cache(kw, num, config.ttl_for(kw)) is None
+            ]
+            batch = search_serpapi_batch(session, misses, num, serp_key, limiter, sem)
+
+        async def search(kw: str) -> list[dict]:
+            if kw in batch:
+                # Each keyword is collected as soon as its own batch task finishes. Pages SerpAPI
+                # didn't accept were already fetched live there; don't pay for the keyword twice.
+                return await batch[kw]
+            return await search_serpapi_async(session, kw, num, serp_key, limiter, sem)
+
+        await _collect(config, run_at, search, state)
+
+
+def main() -> None:
+    config = _load_config()
+    run_at = datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+    # History is written per keyword as soon as its search completes; activity and telegram_bot
+    # are flushed once at the end, or on Ctrl-C / an error with the keywords completed so far.
     _ensure_dirs()
-    _save_history(run_at, results_by_keyword)
-    new_entries = _save_activity(run_at, results_by_keyword)
-    print(f"\nNew URLs this run: {len(new_entries)} (only these are sent to Telegram)")
-    _sync_telegram_bot_and_send(new_entries)
-    print(f"Saved: history → {os.path.join(HISTORY_DIR, run_at[:10] + '.json')}, activity → {ACTIVITY_FILE}, telegram_bot → {TELEGRAM_BOT_FILE}")
+    state = load_state()
+    try:
+        try:
+            asyncio.run(_run_all(config, run_at, state))
+        finally:
+            state.flush()
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Saved keywords completed so far; new URLs: {state.new_count}")
+        _send_telegram(send=False)
+        raise SystemExit(130)
+
+    print(f"\nNew URLs this run: {state.new_count} (only these are sent to Telegram)")
+    _send_telegram()
+    print(f"Saved: history → {os.path.join(HISTORY_DIR, run_at[:10] + '.jsonl')}, activity → {ACTIVITY_FILE}, telegram_bot → {TELEGRAM_BOT_FILE}")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 """
-Send entries from output/telegram_bot.json that have telegram_sent: false to the Telegram group.
+Send bot entries that have telegram_sent: false (unsent in output/urls.db) to the Telegram group.
 
 Usage:
   python send_telegram_pending.py              → send only entries with telegram_sent: false
@@ -7,33 +7,106 @@ Usage:
 """
 
 import argparse
-import json
+import asyncio
+import http.client
 import os
-import time
 
-import requests
-from dotenv import load_dotenv
+import jsonio
+from rate_limiter import RateLimiter
+from state_store import TELEGRAM_BOT_FILE, has_telegram_bot_state, load_pending, mark_sent, reset_sent
 
-load_dotenv()
+# No requests/aiohttp/dotenv: this runs from cron, so startup time matters. Besides the stdlib
+# it only loads this repo's state_store, jsonio and rate_limiter (and orjson, if installed).
+ENV_FILE = os.path.join(os.path.dirname(__file__), ".env")
+TELEGRAM_API_HOST = "api.telegram.org"
+# Send pacing: under the 30 msg/sec bot limit, plus a cap on in-flight requests.
+TELEGRAM_RATE = 25
+TELEGRAM_MAX_TOKENS = 30
+TELEGRAM_MAX_CONCURRENCY = 5
 
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
-TELEGRAM_BOT_FILE = os.path.join(OUTPUT_DIR, "telegram_bot.json")
+
+def _load_env_file(path: str) -> None:
+    """Minimal .env loader: KEY=VALUE lines, # comments; never overrides variables already set."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key, sep, value = line.strip().partition("=")
+            if sep and key and not key.startswith("#"):
+                os.environ.setdefault(key.strip(), value.strip().strip("'\""))
+
+
+_load_env_file(ENV_FILE)
 
 
-def _send_one_telegram_message(text: str, bot_token: str, chat_id: str) -> tuple[bool, str]:
-    """Returns (success, error_message)."""
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+def _send_one_telegram_message(
+    conn: http.client.HTTPSConnection,
+    text: str,
+    bot_token: str,
+    chat_id: str,
+) -> tuple[bool, str]:
+    """Send one message over an open keep-alive connection. Returns (success, error_message)."""
+    payload = jsonio.dumps({"chat_id": chat_id, "text": text})
     try:
-        r = requests.post(url, json={"chat_id": chat_id, "text": text}, timeout=10)
-        if r.status_code == 200:
-            return True, ""
-        try:
-            err = r.json().get("description", r.text[:200])
-        except Exception:
-            err = r.text[:200] if r.text else str(r.status_code)
-        return False, err
+        conn.request(
+            "POST",
+            f"/bot{bot_token}/sendMessage",
+            payload,
+            {"Content-Type": "application/json"},
+        )
+        r = conn.getresponse()
+        body = r.read().decode("utf-8", errors="replace")
     except Exception as e:
+        # Drop the broken socket; http.client reconnects on the next request.
+        conn.close()
         return False, str(e)
+    if r.status == 200:
+        return True, ""
+    try:
+        err = jsonio.loads(body).get("description", body[:200])
+    except Exception:
+        err = body[:200] if body else str(r.status)
+    return False, err
+
+
+async def send_pending(pending: list[dict], bot_token: str, chat_id: str) -> tuple[int, str]:
+    """Send all pending entries concurrently; sets telegram_sent: true on success. Returns (sent_count, first_error)."""
+    limiter = RateLimiter(rate=TELEGRAM_RATE, max_tokens=TELEGRAM_MAX_TOKENS)
+    # One keep-alive connection per concurrent sender. The pool doubles as the concurrency cap:
+    # a sender must hold a connection to send.
+    pool: asyncio.Queue[http.client.HTTPSConnection] = asyncio.Queue()
+    for _ in range(TELEGRAM_MAX_CONCURRENCY):
+        pool.put_nowait(http.client.HTTPSConnection(TELEGRAM_API_HOST, timeout=10))
+
+    async def send_entry(e: dict) -> tuple[dict, bool, str]:
+        text = f"Keyword: {e.get('keyword', '')}\n{e['url']}"
+        conn = await pool.get()
+        try:
+            await limiter.wait_for_token()
+            ok, err = await asyncio.to_thread(_send_one_telegram_message, conn, text, bot_token, chat_id)
+        finally:
+            pool.put_nowait(conn)
+        return e, ok, err
+
+    entries = [e for e in pending if e.get("url")]
+    total = len(entries)
+    sent_count = 0
+    first_error = ""
+    tasks = [send_entry(e) for e in entries]
+    try:
+        for i, task in enumerate(asyncio.as_completed(tasks), 1):
+            e, ok, err = await task
+            if ok:
+                e["telegram_sent"] = True
+                sent_count += 1
+            elif not first_error:
+                first_error = err
+            if i % 10 == 0 or i == total:
+                print(f"  {i}/{total} sent (ok: {sent_count})")
+    finally:
+        while not pool.empty():
+            pool.get_nowait().close()
+    return sent_count, first_error
 
 
 def main() -> None:
@@ -47,53 +120,23 @@ def main() -> None:
         print("Set TELEGRAM_BOT_TOKEN and TELEGRAM_GROUP_CHAT_ID in .env")
         return
 
-    if not os.path.exists(TELEGRAM_BOT_FILE):
+    if not has_telegram_bot_state():
         print(f"No {TELEGRAM_BOT_FILE} found. Run run_keywords.py first.")
         return
 
-    try:
-        with open(TELEGRAM_BOT_FILE, "r", encoding="utf-8") as f:
-            raw = f.read().strip()
-            bot_list = json.loads(raw) if raw else []
-        if not isinstance(bot_list, list):
-            bot_list = []
-    except (json.JSONDecodeError, TypeError):
-        bot_list = []
-
     if args.resend_all:
-        for e in bot_list:
-            e["telegram_sent"] = False
+        reset_sent()
         print("Marked all entries as unsent (telegram_sent: false).")
 
-    pending = [e for e in bot_list if e.get("telegram_sent") is False]
+    pending = load_pending()
     if not pending:
         print("Nothing to send (no entries with telegram_sent: false).")
-        if args.resend_all:
-            with open(TELEGRAM_BOT_FILE, "w", encoding="utf-8") as f:
-                json.dump(bot_list, f, ensure_ascii=False, indent=2)
         return
 
     total = len(pending)
     print(f"Sending {total} URLs (one per message). Progress below:")
-    sent_count = 0
-    first_error = ""
-    for i, e in enumerate(pending, 1):
-        link = e.get("url", "")
-        if not link:
-            continue
-        kw = e.get("keyword", "")
-        text = f"Keyword: {kw}\n{link}"
-        ok, err = _send_one_telegram_message(text, token, chat_id)
-        if ok:
-            e["telegram_sent"] = True
-            sent_count += 1
-        elif not first_error:
-            first_error = err
-        if i % 10 == 0 or i == total:
-            print(f"  {i}/{total} sent (ok: {sent_count})")
-        time.sleep(0.2)
-    with open(TELEGRAM_BOT_FILE, "w", encoding="utf-8") as f:
-        json.dump(bot_list, f, ensure_ascii=False, indent=2)
+    sent_count, first_error = asyncio.run(send_pending(pending, token, chat_id))
+    mark_sent([e["url"] for e in pending if e["telegram_sent"]])
 
     if sent_count:
         print(f"Done. Sent {sent_count}/{total} URLs to Telegram.")
@@ -0,0 +1,354 @@
+"""
+Append-only state files shared by run_keywords.py and send_telegram_pending.py.
+
+Files (under output/):
+  - activity.jsonl      → one activity entry per line (url, first_seen, keyword, title).
+  - telegram_bot.jsonl  → one bot entry per line (url, first_seen, keyword, title).
+  - urls.db             → sqlite table urls(url, keyword, sent): every URL in activity, and whether
+                          it was sent to Telegram (telegram_sent). Dedup and pending come from here.
+  - urls.bloom          → Bloom filter over urls.db, if pybloom_live is installed (fast "new URL" answers).
+
+Runs only append, and look up in urls.db just the URLs they see (unsent ones are read only to send
+them), so a run costs O(new entries) instead of loading all history.
+Old activity.json / telegram_bot.json lists are migrated on first use.
+Compact (drop duplicate lines) from time to time, e.g. weekly from cron:
+  python state_store.py
+"""
+
+import contextlib
+import json
+import os
+import pickle
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+
+import jsonio
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
+ACTIVITY_FILE = os.path.join(OUTPUT_DIR, "activity.jsonl")
+URLS_DB_FILE = os.path.join(OUTPUT_DIR, "urls.db")
+URLS_BLOOM_FILE = os.path.join(OUTPUT_DIR, "urls.bloom")
+TELEGRAM_BOT_FILE = os.path.join(OUTPUT_DIR, "telegram_bot.jsonl")
+LEGACY_ACTIVITY_FILE = os.path.join(OUTPUT_DIR, "activity.json")
+LEGACY_TELEGRAM_BOT_FILE = os.path.join(OUTPUT_DIR, "telegram_bot.json")
+
+BOT_FIELDS = ("url", "first_seen", "keyword", "title")
+# Seconds to wait for another process's write to urls.db (e.g. cron overlapping a run) before giving up.
+URLS_DB_TIMEOUT = 30
+
+
+def _read_lines(path: str) -> list[str]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line for line in f.read().splitlines() if line]
+
+
+def _read_jsonl(path: str) -> list[dict]:
+    """Read a JSON Lines file; skips a half-written last line left by an interrupted run."""
+    entries: list[dict] = []
+    for line in _read_lines(path):
+        try:
+            entry = jsonio.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(entry, dict) and entry.get("url"):
+            entries.append(entry)
+    return entries
+
+
+def _append_lines(path: str, lines: list[str]) -> None:
+    if not lines:
+        return
+    with open(path, "ab") as f:
+        # After an interrupted write the file may end mid-line; start on a fresh line.
+        if f.tell() > 0:
+            with open(path, "rb") as r:
+                r.seek(-1, os.SEEK_END)
+                if r.read(1) != b"\n":
+                    f.write(b"\n")
+        f.write("".join(line + "\n" for line in lines).encode("utf-8"))
+
+
+def _json_line(entry: dict) -> str:
+    return jsonio.dumps(entry).decode("utf-8")
+
+
+def _append_jsonl(path: str, entries: list[dict]) -> None:
+    _append_lines(path, [_json_line(e) for e in entries])
+
+
+def _rewrite_lines(path: str, lines: list[str]) -> None:
+    """Replace path with lines (atomically, so a crash never truncates it)."""
+    jsonio.atomic_write(path, "".join(line + "\n" for line in lines).encode("utf-8"))
+
+
+def _load_legacy_list(path: str) -> list[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read().strip()
+        data = jsonio.loads(raw) if raw else []
+    except (OSError, json.JSONDecodeError):
+        return []
+    if not isinstance(data, list):
+        return []
+    return [e for e in data if isinstance(e, dict) and e.get("url")]
+
+
+def _migrate_legacy() -> None:
+    """
+    One-time conversion of activity.json / telegram_bot.json: urls.db first, then the append-only files.
+    The jsonl files are written only once urls.db is in place, so an interrupted migration is simply
+    redone (and can never mark old URLs unsent).
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if not os.path.exists(URLS_DB_FILE):
+        _build_url_db()
+    if not os.path.exists(ACTIVITY_FILE) and os.path.exists(LEGACY_ACTIVITY_FILE):
+        entries = _load_legacy_list(LEGACY_ACTIVITY_FILE)
+        _rewrite_lines(ACTIVITY_FILE, [_json_line(e) for e in entries])
+    if not os.path.exists(TELEGRAM_BOT_FILE) and os.path.exists(LEGACY_TELEGRAM_BOT_FILE):
+        entries = _load_legacy_list(LEGACY_TELEGRAM_BOT_FILE)
+        _rewrite_lines(
+            TELEGRAM_BOT_FILE,
+            [_json_line({k: e.get(k, "") for k in BOT_FIELDS}) for e in entries],
+        )
+
+
+def has_telegram_bot_state() -> bool:
+    return any(os.path.exists(p) for p in (URLS_DB_FILE, TELEGRAM_BOT_FILE, LEGACY_TELEGRAM_BOT_FILE))
+
+
+class UrlIndex:
+    """
+    Set-like view of urls.db: every URL in activity, looked up on disk instead of held in RAM.
+    With pybloom_live installed, a Bloom filter answers most "not seen" lookups without a query;
+    a Bloom hit is always confirmed in sqlite, so there are no false positives.
+    add() only records the URL in memory; save() writes all of them in one short transaction,
+    so urls.db is never locked while a run is searching.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, bloom=None) -> None:
+        self.conn = conn
+        self.bloom = bloom
+        self.new: dict[str, str] = {}  # url → keyword, added since the last save()
+
+    def __contains__(self, url: str) -> bool:
+        if url in self.new:
+            return True
+        if self.bloom is not None and url not in self.bloom:
+            return False
+        return self.conn.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone() is not None
+
+    def add(self, url: str, keyword: str = "") -> None:
+        """Record url as seen and not yet sent to Telegram."""
+        self.new.setdefault(url, keyword)
+
+    def save(self) -> None:
+        """Write added URLs to urls.db; urls.bloom is rewritten only if there were any."""
+        if not self.new:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO urls(url, keyword) VALUES (?, ?)", self.new.items())
+        except sqlite3.OperationalError as e:
+            # They stay in activity.jsonl, so the next run sees them as new again (and sends them then).
+            print(f"Warning: could not save {len(self.new)} new URLs to {URLS_DB_FILE}: {e}", file=sys.stderr)
+            return
+        if self.bloom is not None:
+            for url in self.new:
+                self.bloom.add(url)
+            # Stored with the last rowid it covers, so a filter that missed a save is detected and rebuilt.
+            jsonio.atomic_write(URLS_BLOOM_FILE, pickle.dumps((_last_rowid(self.conn), self.bloom)))
+        self.new = {}
+
+
+def _last_rowid(conn: sqlite3.Connection) -> int:
+    # Rows are never deleted, so the highest rowid changes exactly when a URL is added.
+    return conn.execute("SELECT MAX(rowid) FROM urls").fetchone()[0] or 0
+
+
+def _load_bloom(conn: sqlite3.Connection):
+    """Bloom filter matching urls.db: from urls.bloom if it is up to date, else rebuilt from the db."""
+    # Imported here so scripts that never open the URL index (send_telegram_pending) don't load it.
+    try:
+        from pybloom_live import ScalableBloomFilter
+    except ImportError:  # optional dependency: without it every lookup goes to sqlite
+        return None
+    last_rowid = _last_rowid(conn)
+    try:
+        with open(URLS_BLOOM_FILE, "rb") as f:
+            saved_rowid, bloom = pickle.load(f)
+        if saved_rowid == last_rowid:
+            return bloom
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+    bloom = ScalableBloomFilter(initial_capacity=100_000, error_rate=0.001)
+    for (url,) in conn.execute("SELECT url FROM urls"):
+        bloom.add(url)
+    jsonio.atomic_write(URLS_BLOOM_FILE, pickle.dumps((last_rowid, bloom)))
+    return bloom
+
+
+def _build_url_db() -> None:
+    """
+    Create urls.db: activity URLs as already sent (so old URLs are not resent), then, on installs not
+    yet migrated, the entries of telegram_bot.json with their telegram_sent flag.
+    Built under a temp name and renamed, so an interrupted build is redone on the next run.
+    """
+    tmp = URLS_DB_FILE + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    if os.path.exists(ACTIVITY_FILE):
+        activity = _read_jsonl(ACTIVITY_FILE)
+    else:
+        activity = _load_legacy_list(LEGACY_ACTIVITY_FILE)
+    bot_rows: dict[str, tuple] = {}
+    if not os.path.exists(TELEGRAM_BOT_FILE):
+        for e in _load_legacy_list(LEGACY_TELEGRAM_BOT_FILE):
+            bot_rows.setdefault(e["url"], (e["url"], e.get("keyword", ""), int(e.get("telegram_sent") is True)))
+    with contextlib.closing(sqlite3.connect(tmp)) as conn:
+        conn.execute(
+            "CREATE TABLE urls(url TEXT PRIMARY KEY, keyword TEXT NOT NULL DEFAULT '', sent INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX urls_unsent ON urls(sent) WHERE sent = 0")
+        conn.executemany(
+            "INSERT OR IGNORE INTO urls(url, keyword, sent) VALUES (?, ?, 1)",
+            ((e["url"], e.get("keyword", "")) for e in activity),
+        )
+        conn.executemany(
+            "INSERT INTO urls(url, keyword, sent) VALUES (?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET keyword = excluded.keyword, sent = excluded.sent",
+            bot_rows.values(),
+        )
+        conn.commit()
+    os.replace(tmp, URLS_DB_FILE)
+
+
+def _connect_url_db() -> sqlite3.Connection:
+    """Open urls.db (WAL), creating it on first use."""
+    _migrate_legacy()
+    conn = sqlite3.connect(URLS_DB_FILE, timeout=URLS_DB_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def open_url_index() -> UrlIndex:
+    """All URLs already in activity."""
+    conn = _connect_url_db()
+    return UrlIndex(conn, _load_bloom(conn))
+
+
+def load_activity() -> list[dict]:
+    _migrate_legacy()
+    return _read_jsonl(ACTIVITY_FILE)
+
+
+def append_activity(entries: list[dict]) -> None:
+    """Append new activity entries (their URLs go in the UrlIndex separately)."""
+    _migrate_legacy()
+    _append_jsonl(ACTIVITY_FILE, entries)
+
+
+def append_bot_entries(entries: list[dict]) -> None:
+    """Append bot entries to telegram_bot.jsonl (whether they were sent is tracked in urls.db)."""
+    _migrate_legacy()
+    _append_jsonl(TELEGRAM_BOT_FILE, [{k: e.get(k, "") for k in BOT_FIELDS} for e in entries])
+
+
+def load_pending() -> list[dict]:
+    """Bot entries not yet sent to Telegram (url, keyword, telegram_sent: false), oldest first."""
+    with contextlib.closing(_connect_url_db()) as conn:
+        rows = conn.execute("SELECT url, keyword FROM urls WHERE sent = 0 ORDER BY rowid")
+        return [{"url": url, "keyword": keyword, "telegram_sent": False} for url, keyword in rows]
+
+
+def count_pending() -> int:
+    with contextlib.closing(_connect_url_db()) as conn:
+        return conn.execute("SELECT COUNT(*) FROM urls WHERE sent = 0").fetchone()[0]
+
+
+def mark_sent(urls: list[str]) -> None:
+    if not urls:
+        return
+    try:
+        with contextlib.closing(_connect_url_db()) as conn, conn:
+            conn.executemany("UPDATE urls SET sent = 1 WHERE url = ?", ((u,) for u in urls))
+    except sqlite3.OperationalError as e:
+        print(f"Warning: could not mark {len(urls)} URLs as sent ({e}); they will be sent again.", file=sys.stderr)
+
+
+def reset_sent() -> None:
+    """Mark every bot entry as unsent."""
+    with contextlib.closing(_connect_url_db()) as conn, conn:
+        conn.execute("UPDATE urls SET sent = 0")
+
+
+@dataclass
+class State:
+    """
+    Activity + Telegram bot state for one run: the URL index on disk plus this run's additions.
+    ingest() adds a keyword's results; flush() appends everything new to disk in one go.
+    Unsent entries are not loaded here; the sender reads them with load_pending().
+    """
+
+    seen_urls: UrlIndex
+    new_activity: list[dict] = field(default_factory=list)
+    new_count: int = 0
+
+    def ingest(self, run_at: str, keyword: str, items: list[dict]) -> list[dict]:
+        """Add results' unseen URLs to activity and (as unsent) to the URL index. Returns the new entries."""
+        added: list[dict] = []
+        for r in items:
+            link = r.get("link")
+            if not link or link in self.seen_urls:
+                continue
+            self.seen_urls.add(link, keyword)
+            added.append({"url": link, "first_seen": run_at, "keyword": keyword, "title": r.get("title", "")})
+        self.new_activity.extend(added)
+        self.new_count += len(added)
+        return added
+
+    def flush(self) -> None:
+        """
+        Append new activity and bot entries to their files, then save the URL index.
+        The writes are not atomic together. The index goes last, so a crash in between only
+        makes the next run see those URLs as new again (duplicate lines, which compact() drops);
+        it never marks a URL seen that is missing from telegram_bot.jsonl.
+        """
+        append_activity(self.new_activity)
+        append_bot_entries(self.new_activity)
+        self.seen_urls.save()
+        self.new_activity = []
+
+
+def load_state() -> State:
+    """Open the URL index (nothing from the history is loaded into memory)."""
+    return State(open_url_index())
+
+
+def compact() -> None:
+    """Rewrite activity.jsonl and telegram_bot.jsonl without duplicate entries (urls.db never has any)."""
+    activity: dict[str, dict] = {}
+    for e in load_activity():
+        activity.setdefault(e["url"], e)
+    _rewrite_lines(ACTIVITY_FILE, [_json_line(e) for e in activity.values()])
+
+    bot_entries: dict[str, dict] = {}
+    for e in _read_jsonl(TELEGRAM_BOT_FILE):
+        bot_entries.setdefault(e["url"], e)
+    _rewrite_lines(
+        TELEGRAM_BOT_FILE,
+        [_json_line({k: e.get(k, "") for k in BOT_FIELDS}) for e in bot_entries.values()],
+    )
+
+
+def main() -> None:
+    """CLI entry point: compact the state files."""
+    compact()
+    print(f"Compacted: activity → {ACTIVITY_FILE}, telegram_bot → {TELEGRAM_BOT_FILE}")
+
+
+if __name__ == "__main__":
+    main()